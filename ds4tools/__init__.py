@@ -0,0 +1,29 @@
+"""
+Library API of the DS4 tools.
+
+Nothing here imports usb or construct, and no controller is opened until
+the first report is exchanged:
+
+    import ds4tools
+
+    with ds4tools.session() as dev:
+        print(ds4tools.info(dev))
+        ds4tools.set_bt_enable(dev, 1)
+
+Several fields can be written and verified together with
+ds4tools.write(dev, pcba_id=..., bt_enable=...).
+
+DualSense readers are in ds4tools.ds5.
+"""
+
+from .hid import HID_REQ, Device, DeviceError, format_mac
+from .ds4 import (
+    DS4, session, WriteVerifyError, Field, FIELDS, Transaction, write,
+    VersionInfo, info, read_flash_mirror, reset,
+    get_bt_mac_addr, set_bt_mac_addr, get_bt_link_info, set_bt_link_info,
+    get_imu_calibration, set_imu_calibration,
+    get_flash_mirror_status, set_flash_mirror_status,
+    get_pcba_id, set_pcba_id, get_bt_enable, set_bt_enable,
+    set_serial_number,
+)
+from . import ds5
@@ -0,0 +1,213 @@
+import argparse
+import binascii
+import sys
+
+from . import ds4
+from .hid import DeviceError, format_mac
+from .ds4 import DS4, WriteVerifyError
+
+def report_write(f, *args):
+    try:
+        unverified = f(*args)
+    except WriteVerifyError as e:
+        print("ERROR: %s" % (e, ))
+        exit(1)
+
+    if unverified:
+        print("Written without verification: %s" % (', '.join(unverified), ))
+    else:
+        print("Verified")
+
+def dump_flash(dev, args):
+    path = args.output_file
+    if sys.platform == 'win32':
+        path = path.translate({ord(i): None for i in '*<>?:|'})
+    print('Dumping flash mirror to %s...' % (path))
+    data = ds4.read_flash_mirror(dev)
+    with open(path, 'wb') as f:
+        f.write(data)
+    print('done')
+
+def info(dev, args):
+    print(ds4.info(dev))
+
+def reset(dev, args):
+    print("Send reset command...")
+    ds4.reset(dev)
+    print("Reset completed")
+
+def get_bt_mac_addr(dev, args):
+    print("DS4 MAC: %s" % (format_mac(ds4.get_bt_mac_addr(dev)), ))
+
+def set_bt_mac_addr(dev, args):
+    new_mac_addr = binascii.unhexlify(args.new_mac_addr)
+    assert(len(new_mac_addr) == 6)
+    report_write(ds4.set_bt_mac_addr, dev, new_mac_addr)
+
+def get_bt_link_info(dev, args):
+    ds4_mac, host_mac = ds4.get_bt_link_info(dev)
+    print("DS4 MAC: %s" % (format_mac(ds4_mac), ))
+    print("Host MAC: %s" % (format_mac(host_mac), ))
+
+def set_bt_link_info(dev, args):
+    host_addr = binascii.unhexlify(args.host_addr)
+    link_key = binascii.unhexlify(args.link_key)
+
+    if len(host_addr) != 6 or len(link_key) != 16:
+        print("Usage: set-bt-link-info <6-bytes host addr> <16-bytes link key>")
+
+        print("Host addr len: %d" % (len(host_addr), ))
+        print("Link key len: %d" % (len(link_key), ))
+        exit(1)
+
+    host_addr_str = format_mac(host_addr)
+    link_key_str  = binascii.hexlify(link_key).decode('utf-8')
+
+    print("Setting host_addr=%s link_key=%s" % (host_addr_str, link_key_str))
+    report_write(ds4.set_bt_link_info, dev, host_addr, link_key)
+
+def get_imu_calibration(dev, args):
+    data = ds4.get_imu_calibration(dev)
+    print("Raw data: %s" % (binascii.hexlify(data).decode('utf-8'), ))
+
+def set_imu_calibration(dev, args):
+    data = binascii.unhexlify(args.data)
+    assert len(data) == 36
+
+    print("Update IMU calibration data to: %s" % (binascii.hexlify(data).decode('utf-8')))
+    report_write(ds4.set_imu_calibration, dev, data)
+
+def get_flash_mirror_status(dev, args):
+    print("Changes in flash mirror are temporary: %d" % (ds4.get_flash_mirror_status(dev), ))
+
+def set_flash_mirror_status(dev, args):
+    if args.temporary not in [0,1]:
+        print("Error: argument must be 0 or 1")
+        exit(1)
+    if args.temporary == 1:
+        print("Set to: temporary")
+    else:
+        print("Set to: permanent")
+    ds4.set_flash_mirror_status(dev, args.temporary)
+
+    print("Re-reading flash mirror status..")
+    get_flash_mirror_status(dev, args)
+
+def get_pcba_id(dev, args):
+    pcba_id = ds4.get_pcba_id(dev)
+    print("PCBA Id: %s" % (binascii.hexlify(pcba_id).decode('utf-8'), ))
+
+def set_pcba_id(dev, args):
+    data = binascii.unhexlify(args.data)
+    assert len(data) == 6
+
+    print("Set to: %s" % (binascii.hexlify(data).decode('utf-8')))
+    report_write(ds4.set_pcba_id, dev, data)
+
+def get_bt_enable(dev, args):
+    print("BT Enable: %s" % (ds4.get_bt_enable(dev), ))
+
+def set_bt_enable(dev, args):
+    print("Set to: %02x" % (1 if args.enable else 0, ))
+    report_write(ds4.set_bt_enable, dev, args.enable)
+
+def get_serial_number(dev, args):
+    print('get_serial_number() isn\'t implemented yet')
+
+def set_serial_number(dev, args):
+    data = binascii.unhexlify(args.data)
+    assert len(data) == 2
+
+    print("Change serial number to: %s" % (binascii.hexlify(data).decode('utf-8')))
+    report_write(ds4.set_serial_number, dev, data)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Play with the DS4 controller",
+                                     epilog="By the_al")
+
+    subparsers = parser.add_subparsers(dest="action")
+
+    # Dump flash mirror
+    p = subparsers.add_parser('dump-flash', help="Dump the flash mirror")
+    p.add_argument('output_file', help="Output file to write the dump to")
+    p.set_defaults(func=dump_flash)
+
+    # Info
+    p = subparsers.add_parser('info', help="Print info about the DS4")
+    p.set_defaults(func=info)
+
+    # Reset
+    p = subparsers.add_parser('reset', help="Reset the DS4")
+    p.set_defaults(func=reset)
+
+    # GET Mac Addr + SET Mac Addr
+    p = subparsers.add_parser('get-bt-mac-addr', help="Get the Bluetooth MAC Address")
+    p.set_defaults(func=get_bt_mac_addr)
+
+    p = subparsers.add_parser('set-bt-mac-addr', help="Set the Bluetooth MAC Address")
+    p.add_argument('new_mac_addr', help="New MAC address to store")
+    p.set_defaults(func=set_bt_mac_addr)
+
+    # GET BT Link Info + SET BT Link Info
+    p = subparsers.add_parser('get-bt-link-info', help="Get Bluetooth link information")
+    p.set_defaults(func=get_bt_link_info)
+
+    p = subparsers.add_parser('set-bt-link-info', help="Update Bluetooth link information")
+    p.add_argument('host_addr', help="Host MAC Address to connect to")
+    p.add_argument('link_key', help="Bluetooth link key")
+    p.set_defaults(func=set_bt_link_info)
+
+    # GET IMU Calibration + SET IMU Calibration
+    p = subparsers.add_parser('get-imu-calibration', help="Retrieve IMU calibration data")
+    p.set_defaults(func=get_imu_calibration)
+
+    p = subparsers.add_parser('set-imu-calibration', help="Change IMU calibration data")
+    p.add_argument('data', help="New calibration data to store")
+    p.set_defaults(func=set_imu_calibration)
+
+    # GET Flash Mirror Enable + SET Flash Mirror Enable
+    p = subparsers.add_parser('get-flash-mirror-status', help="Get flash-mirror status")
+    p.set_defaults(func=get_flash_mirror_status)
+
+    p = subparsers.add_parser('set-flash-mirror-status', help="Change how flash mirror works")
+    p.add_argument('temporary', type=int, help="Set if changes in configuration are temporary(1) or permanent(0)")
+    p.set_defaults(func=set_flash_mirror_status)
+
+    # GET PCBA Id + SET PCBA Id
+    p = subparsers.add_parser('get-pcba-id', help="Get the PCBA manufacturer ID")
+    p.set_defaults(func=get_pcba_id)
+
+    p = subparsers.add_parser('set-pcba-id', help="Change the PCBA manufacturer ID")
+    p.add_argument('data', help="New manufacturer ID (6 bytes)")
+    p.set_defaults(func=set_pcba_id)
+
+    # "BT ENABLE"
+    p = subparsers.add_parser('get-bt-enable', help="Read BT enable bit")
+    p.set_defaults(func=get_bt_enable)
+
+    p = subparsers.add_parser('set-bt-enable', help="Change the BT enable bit")
+    p.add_argument('enable', type=int, help="0 to disable and 1 to enable")
+    p.set_defaults(func=set_bt_enable)
+
+    # GET Serial Number + SET Serial Number
+    p = subparsers.add_parser('get-serial-number', help="Read the serial number")
+    p.set_defaults(func=get_serial_number)
+
+    p = subparsers.add_parser('set-serial-number', help="Set the serial number")
+    p.add_argument('data', help="2 bytes hex")
+    p.set_defaults(func=set_serial_number)
+
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not hasattr(args, "func"):
+        parser.print_help()
+        exit(1)
+
+    try:
+        with DS4() as dev:
+            args.func(dev, args)
+    except DeviceError as e:
+        sys.exit(str(e))
@@ -0,0 +1,294 @@
+import binascii
+import struct
+
+from .hid import Device
+
+class DS4(Device):
+    NAME = "DualShock 4"
+    VALID_DEVICE_IDS = [
+        (0x054c, 0x05c4),
+        (0x054c, 0x09cc)
+    ]
+
+    def flash_mirror_read(self, offset):
+        assert offset < 0x800, 'flash mirror offset out of bounds'
+        self.hid_set_report(0x08, struct.pack('>BH', 0xff, offset))
+        return self.hid_get_report(0x11, 2)
+
+def session():
+    """
+    Return a DS4 to be used as a context manager. The controller is opened
+    on the first request and released when leaving the with block.
+    """
+    return DS4()
+
+class WriteVerifyError(Exception):
+    pass
+
+class Field:
+    """
+    A writable setting of the DS4 and where it can be read back from.
+
+    source is ('report', report_id, size) for a feature report or
+    ('flash', offset) for a flash mirror word; None if it can't be read back.
+    expect maps the value written to what extract should find afterwards.
+    size is the length in bytes of the value, None for a 0/1 flag.
+    """
+    def __init__(self, name, size, write, source=None, extract=None, expect=None, restorable=True):
+        self.name = name
+        self.size = size
+        self.write = write
+        self.source = source
+        self.extract = extract
+        self.expect = expect if expect is not None else (lambda v: v)
+        self.restorable = restorable and source is not None
+
+FIELDS = {f.name: f for f in [
+    Field('bt_mac_addr', 6,
+          lambda dev, v: dev.hid_set_report(0x80, v),
+          ('report', 0x81, 8), lambda buf: buf[0:6]),
+    # The link key can't be read back: only the host address is verified
+    # and the old pairing can't be restored.
+    Field('bt_link_info', 6 + 16,
+          lambda dev, v: dev.hid_set_report(0x13, v),
+          ('report', 0x12, 6 + 3 + 6), lambda buf: buf[9:15],
+          expect=lambda v: v[0:6], restorable=False),
+    # Report 0x02 returns the 36 bytes written through 0x04
+    Field('imu_calibration', 36,
+          lambda dev, v: dev.hid_set_report(0x04, v),
+          ('report', 0x02, 41), lambda buf: buf[0:36]),
+    Field('pcba_id', 6,
+          lambda dev, v: dev.hid_set_report(0x85, v),
+          ('report', 0x86, 6), lambda buf: buf[0:6]),
+    Field('bt_enable', None,
+          lambda dev, v: dev.hid_set_report(0xa1, struct.pack('B', v)),
+          ('flash', 0x700), lambda buf: buf[0]),
+    # Location of the serial number is unknown, see get_serial_number
+    Field('serial_number', 2,
+          lambda dev, v: dev.hid_set_report(0x08, struct.pack('>B', 0x10) + v)),
+]}
+
+class Transaction:
+    """
+    Apply a group of writes and verify them, rolling back on mismatch.
+
+    Writes are queued with set() and applied by commit(), or when leaving
+    the with block. Every report or flash word involved is read once before
+    writing (snapshot) and once after (verify), whatever the number of
+    fields sharing it.
+    """
+    def __init__(self, dev):
+        self.__dev = dev
+        self.__writes = {}
+        self.unverified = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+    def set(self, name, value):
+        if name not in FIELDS:
+            raise ValueError('unknown field %s' % name)
+        size = FIELDS[name].size
+        if size is None:
+            if value not in [0, 1]:
+                raise ValueError('%s must be 0 or 1' % name)
+        elif not isinstance(value, bytes) or len(value) != size:
+            raise ValueError('%s must be %d bytes' % (name, size))
+        self.__writes[name] = value
+
+    def __read(self, fields):
+        cache = {}
+        for f in fields:
+            if f.source is None or f.source in cache:
+                continue
+            if f.source[0] == 'flash':
+                cache[f.source] = self.__dev.flash_mirror_read(f.source[1])
+            else:
+                cache[f.source] = self.__dev.hid_get_report(*f.source[1:])
+        return {f.name: f.extract(cache[f.source]) for f in fields if f.source is not None}
+
+    def __write(self, writes, attempted):
+        for name, value in writes.items():
+            attempted.append(name)
+            FIELDS[name].write(self.__dev, value)
+
+    def __verify(self, writes):
+        values = self.__read([FIELDS[name] for name in writes])
+        return [name for name, value in writes.items()
+                if name in values and values[name] != FIELDS[name].expect(value)]
+
+    def __rollback(self, snapshot, names):
+        """
+        Restore the snapshot of names, returns what happened for the error message.
+        """
+        restore = {name: snapshot[name] for name in names if FIELDS[name].restorable}
+        not_restored = [name for name in names if name not in restore]
+        if not restore:
+            msg = 'not rolled back'
+        else:
+            try:
+                self.__write(restore, [])
+                failed = self.__verify(restore)
+            except Exception as e:
+                msg = 'rollback failed too: %s' % (e, )
+            else:
+                if failed:
+                    msg = 'rollback failed too for %s' % ', '.join(failed)
+                else:
+                    msg = 'rolled back'
+        if not_restored:
+            msg += ' (could not restore %s)' % ', '.join(not_restored)
+        return msg
+
+    def commit(self):
+        """
+        Returns the names of the fields written without verification.
+        """
+        writes, self.__writes = self.__writes, {}
+        self.unverified = [name for name in writes if FIELDS[name].source is None]
+        if not writes:
+            return self.unverified
+
+        snapshot = self.__read([FIELDS[name] for name in writes])
+
+        # A write that raised may still have reached the controller,
+        # so it is rolled back along with the previous ones.
+        attempted = []
+        try:
+            self.__write(writes, attempted)
+        except Exception as e:
+            raise WriteVerifyError('writing %s failed: %s; %s' % (
+                attempted[-1], e, self.__rollback(snapshot, attempted))) from e
+
+        try:
+            failed = self.__verify(writes)
+        except Exception as e:
+            raise WriteVerifyError('verifying %s failed: %s; %s' % (
+                ', '.join(writes), e, self.__rollback(snapshot, writes))) from e
+        if failed:
+            raise WriteVerifyError('verification failed for %s; %s' % (
+                ', '.join(failed), self.__rollback(snapshot, writes)))
+        return self.unverified
+
+def write(dev, **fields):
+    """
+    Write several fields in a single Transaction, e.g.
+    write(dev, pcba_id=b'...', bt_enable=1).
+    """
+    with Transaction(dev) as t:
+        for name, value in fields.items():
+            t.set(name, value)
+    return t.unverified
+
+class VersionInfo:
+    version_info_t = None
+
+    @classmethod
+    def struct(cls):
+        if cls.version_info_t is None:
+            from construct import Struct, PaddedString, Int16ul, Int32ul
+            cls.version_info_t = Struct(
+                'compile_date' / PaddedString(0x10, encoding='ascii'),
+                'compile_time' / PaddedString(0x10, encoding='ascii'),
+                'hw_ver_major' / Int16ul,
+                'hw_ver_minor' / Int16ul,
+                'sw_ver_major' / Int32ul,
+                'sw_ver_minor' / Int16ul,
+                'sw_series' / Int16ul,
+                'code_size' / Int32ul,
+            )
+        return cls.version_info_t
+
+    def __init__(s, buf):
+        s.info = s.struct().parse(buf)
+
+    def __repr__(s):
+        l = 'Compiled at: %s %s\n'\
+            'hw_ver:%04x.%04x\n'\
+            'sw_ver:%08x.%04x sw_series:%04x\n'\
+            'code size:%08x' % (
+                s.info.compile_date, s.info.compile_time,
+                s.info.hw_ver_major, s.info.hw_ver_minor,
+                s.info.sw_ver_major, s.info.sw_ver_minor, s.info.sw_series,
+                s.info.code_size
+            )
+        return l
+
+def info(dev):
+    return VersionInfo(dev.hid_get_report(0xa3, 0x30))
+
+def read_flash_mirror(dev):
+    # TODO can't correctly calc checksum for some reason
+    return b''.join(dev.flash_mirror_read(i) for i in range(0, 0x800, 2))
+
+def reset(dev):
+    import usb.core
+    try:
+        dev.hid_set_report(0xa0, struct.pack('BBB', 4, 1, 0))
+    except usb.core.USBError as e:
+        # Reset worked
+        dev.close()
+        dev.open()
+
+def get_bt_mac_addr(dev):
+    return dev.hid_get_report(0x81, 8)[0:6]
+
+def set_bt_mac_addr(dev, addr):
+    return write(dev, bt_mac_addr=addr)
+
+def get_bt_link_info(dev):
+    """
+    Returns (ds4_mac, host_mac).
+    """
+    buf = dev.hid_get_report(0x12, 6 + 3 + 6)
+    ds4_mac, unk, host_mac = buf[0:6], buf[6:9], buf[9:15]
+    assert unk == b'\x08\x25\x00'
+    return ds4_mac, host_mac
+
+def set_bt_link_info(dev, host_addr, link_key):
+    # The field only knows the total length
+    if len(host_addr) != 6 or len(link_key) != 16:
+        raise ValueError('host_addr must be 6 bytes and link_key 16 bytes')
+    return write(dev, bt_link_info=host_addr + link_key)
+
+def get_imu_calibration(dev):
+    return dev.hid_get_report(0x02, 41)
+
+def set_imu_calibration(dev, data):
+    return write(dev, imu_calibration=data)
+
+def get_flash_mirror_status(dev):
+    """
+    Returns 1 if changes in flash mirror are temporary, 0 if permanent.
+    """
+    # Read byte 12
+    return dev.flash_mirror_read(12)[0]
+
+def set_flash_mirror_status(dev, temporary):
+    assert temporary in [0, 1]
+    if temporary == 1:
+        dev.hid_set_report(0xa0, struct.pack('BBB', 10, 1, 0))
+    else:
+        code = binascii.unhexlify("3e717f89")
+        dev.hid_set_report(0xa0, struct.pack('BB', 10, 2) + code)
+
+def get_pcba_id(dev):
+    return dev.hid_get_report(0x86, 6)
+
+def set_pcba_id(dev, data):
+    return write(dev, pcba_id=data)
+
+def get_bt_enable(dev):
+    # Read byte 0x700
+    return dev.flash_mirror_read(0x700)[0]
+
+def set_bt_enable(dev, enable):
+    return write(dev, bt_enable=1 if enable else 0)
+
+def set_serial_number(dev, data):
+    return write(dev, serial_number=data)
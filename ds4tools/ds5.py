@@ -0,0 +1,133 @@
+import binascii
+import struct
+from contextlib import contextmanager
+
+from .hid import Device, format_mac
+
+class DS5(Device):
+    NAME = "DualSense"
+    VALID_DEVICE_IDS = [
+        (0x054c, 0x0ce6)
+    ]
+
+def session():
+    """
+    Return a DS5 to be used as a context manager. The controller is opened
+    on the first request and released when leaving the with block.
+    """
+    return DS5()
+
+@contextmanager
+def nvs_unlocked(dev):
+    """
+    Unlock NVS so that calibration is stored permanently. NVS is locked
+    again when leaving the with block, even if an operation failed.
+    """
+    print("Unlocking NVS")
+    dev.hid_set_report(0x80, struct.pack('BBBBBB', 3, 2, 101, 50, 64, 12))
+    try:
+        yield dev
+    finally:
+        print("Re-locking NVS")
+        dev.hid_set_report(0x80, struct.pack('BB', 3, 1))
+
+class FirmwareInfo:
+    REPORT = (0x20, 63)
+    firmware_info_t = None
+
+    @classmethod
+    def struct(cls):
+        if cls.firmware_info_t is None:
+            from construct import Struct, PaddedString, Bytes, Padding, Int8ul, Int16ul, Int32ul
+            cls.firmware_info_t = Struct(
+                'build_date' / PaddedString(11, encoding='ascii'),
+                'build_time' / PaddedString(8, encoding='ascii'),
+                'fw_type' / Int16ul,
+                'sw_series' / Int16ul,
+                'hw_info' / Int32ul,
+                'fw_version' / Int32ul,
+                'device_info' / Bytes(12),
+                'update_version' / Int16ul,
+                'update_image_info' / Int8ul,
+                Padding(1),
+                'sbl_fw_version' / Int32ul,
+                'venom_fw_version' / Int32ul,
+                'spider_fw_version' / Int32ul,
+            )
+        return cls.firmware_info_t
+
+    def __init__(s, buf):
+        s.info = s.struct().parse(buf)
+
+    def __repr__(s):
+        l = 'Compiled at: %s %s\n'\
+            'fw_type:%04x sw_series:%04x\n'\
+            'hw_info:%08x fw_version:%08x\n'\
+            'device_info:%s\n'\
+            'update_version:%04x update_image_info:%02x\n'\
+            'sbl_fw_version:%08x venom_fw_version:%08x spider_fw_version:%08x' % (
+                s.info.build_date, s.info.build_time,
+                s.info.fw_type, s.info.sw_series,
+                s.info.hw_info, s.info.fw_version,
+                binascii.hexlify(s.info.device_info).decode('utf-8'),
+                s.info.update_version, s.info.update_image_info,
+                s.info.sbl_fw_version, s.info.venom_fw_version, s.info.spider_fw_version
+            )
+        return l
+
+class PairingInfo:
+    REPORT = (0x09, 19)
+
+    def __init__(s, buf):
+        # Stored least significant byte first
+        s.mac = bytes(reversed(buf[0:6]))
+
+    def __repr__(s):
+        return "DualSense MAC: %s" % (format_mac(s.mac), )
+
+class CalibrationStatus:
+    """
+    Status of the last calibration command sent through report 0x82.
+    state is 1 and result 0xff while the DualSense is sampling data.
+    """
+    REPORT = (0x83, 4)
+
+    def __init__(s, buf):
+        s.device_id, s.target_id, s.state, s.result = struct.unpack('BBBB', buf[0:4])
+
+    def __repr__(s):
+        return "Calibration: device_id=%02x target_id=%02x state=%02x result=%02x" % (
+            s.device_id, s.target_id, s.state, s.result)
+
+def get_reports(dev, reports):
+    """
+    Fetch each (report_id, size) once, in a single pass.
+    """
+    out = {}
+    for report_id, size in reports:
+        if report_id not in out:
+            out[report_id] = dev.hid_get_report(report_id, size)
+    return out
+
+def read(dev, *readers):
+    """
+    Parse one object per reader class, e.g.
+    info, pairing = read(dev, FirmwareInfo, PairingInfo).
+    """
+    bufs = get_reports(dev, [r.REPORT for r in readers])
+    return [r(bufs[r.REPORT[0]]) for r in readers]
+
+def info(dev):
+    return read(dev, FirmwareInfo)[0]
+
+def get_bt_mac_addr(dev):
+    return read(dev, PairingInfo)[0].mac
+
+def get_calibration_status(dev):
+    return read(dev, CalibrationStatus)[0]
+
+def state(dev):
+    """
+    Returns (FirmwareInfo, PairingInfo, CalibrationStatus).
+    """
+    return read(dev, FirmwareInfo, PairingInfo, CalibrationStatus)
@@ -0,0 +1,94 @@
+import array
+import struct
+import sys
+import time
+
+class HID_REQ:
+    # usb.util.build_request_type(CTRL_IN / CTRL_OUT, CTRL_TYPE_CLASS,
+    # CTRL_RECIPIENT_INTERFACE), spelled out so that usb isn't imported
+    # until a device is actually opened.
+    DEV_TO_HOST = 0xa1
+    HOST_TO_DEV = 0x21
+    GET_REPORT = 0x01
+    SET_REPORT = 0x09
+
+def format_mac(addr):
+    return "%02x:%02x:%02x:%02x:%02x:%02x" % struct.unpack("BBBBBB", addr)
+
+class DeviceError(Exception):
+    pass
+
+class Device:
+    """
+    A USB HID controller, opened on first use.
+
+    Subclasses set NAME and VALID_DEVICE_IDS. Creating an instance doesn't
+    touch USB; the first report exchanged waits for the controller to be
+    plugged in and detaches the kernel driver.
+    """
+    NAME = None
+    VALID_DEVICE_IDS = []
+
+    def __init__(self):
+        self.__dev = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @property
+    def dev(self):
+        if self.__dev is None:
+            self.open()
+        return self.__dev
+
+    def open(self):
+        """
+        Wait for the controller, does nothing if it is already open.
+        """
+        import usb.core
+
+        if self.__dev is not None:
+            return
+
+        self.wait_for_device()
+
+        if sys.platform != 'win32' and self.__dev.is_kernel_driver_active(0):
+            try:
+                self.__dev.detach_kernel_driver(0)
+            except usb.core.USBError as e:
+                self.close()
+                raise DeviceError('Could not detach kernel driver: %s' % str(e)) from e
+
+    def close(self):
+        if self.__dev is not None:
+            import usb.util
+            usb.util.dispose_resources(self.__dev)
+            self.__dev = None
+
+    def wait_for_device(self):
+        import usb.core
+
+        print("Waiting for a %s..." % (self.NAME, ))
+        while True:
+            for i in self.VALID_DEVICE_IDS:
+                self.__dev = usb.core.find(idVendor=i[0], idProduct=i[1])
+                if self.__dev is not None:
+                    print("Found a %s: vendorId=%04x productId=%04x" % (self.NAME, i[0], i[1]))
+                    return
+            time.sleep(1)
+
+    def hid_get_report(self, report_id, size):
+        #ctrl_transfer(bmRequestType, bRequest, wValue=0, wIndex=0, data_or_wLength=None, timeout=None)
+        assert isinstance(size, int), 'get_report size must be integer'
+        assert report_id <= 0xff, 'only support report_type == 0'
+        return self.dev.ctrl_transfer(HID_REQ.DEV_TO_HOST, HID_REQ.GET_REPORT, report_id, 0, size + 1)[1:].tobytes()
+
+    def hid_set_report(self, report_id, buf):
+        assert isinstance(buf, (bytes, array.array)), 'set_report buf must be buffer'
+        assert report_id <= 0xff, 'only support report_type == 0'
+        buf = struct.pack('B', report_id) + buf
+        return self.dev.ctrl_transfer(HID_REQ.HOST_TO_DEV, HID_REQ.SET_REPORT, (3 << 8) | report_id, 0, buf)
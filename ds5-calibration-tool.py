@@ -1,91 +1,51 @@
 #!/usr/bin/env python3
 
-import usb.core
-import usb.util
-import array
 import struct
-import sys
-import binascii
-import time
-from construct import *
 import argparse
+import sys
+from contextlib import nullcontext
 
-dev = None
-
-VALID_DEVICE_IDS = [
-    (0x054c, 0x0ce6)
-]
-
-def wait_for_device():
-    global dev
+from ds4tools import ds5
+from ds4tools.hid import DeviceError, format_mac
 
-    print("Waiting for a DualSense...")
-    while True:
-        for i in VALID_DEVICE_IDS:
-            dev = usb.core.find(idVendor=i[0], idProduct=i[1])
-            if dev is not None:
-                print("Found a DualSense: vendorId=%04x productId=%04x" % (i[0], i[1]))
-                return
-        time.sleep(1)
-
-class HID_REQ:
-    DEV_TO_HOST = usb.util.build_request_type(
-        usb.util.CTRL_IN, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_INTERFACE)
-    HOST_TO_DEV = usb.util.build_request_type(
-        usb.util.CTRL_OUT, usb.util.CTRL_TYPE_CLASS, usb.util.CTRL_RECIPIENT_INTERFACE)
-    GET_REPORT = 0x01
-    SET_REPORT = 0x09
-
-def hid_get_report(dev, report_id, size):
-    assert isinstance(size, int), 'get_report size must be integer'
-    assert report_id <= 0xff, 'only support report_type == 0'
-    return dev.ctrl_transfer(HID_REQ.DEV_TO_HOST, HID_REQ.GET_REPORT, report_id, 0, size + 1)[1:].tobytes()
-
-
-def hid_set_report(dev, report_id, buf):
-    assert isinstance(buf, (bytes, array.array)
-                      ), 'set_report buf must be buffer'
-    assert report_id <= 0xff, 'only support report_type == 0'
-    buf = struct.pack('B', report_id) + buf
-    return dev.ctrl_transfer(HID_REQ.HOST_TO_DEV, HID_REQ.SET_REPORT, (3 << 8) | report_id, 0, buf)
-
-def do_stick_center_calibration():
+def do_stick_center_calibration(dev):
     print("Starting analog center calibration...")
 
     deviceId = 1
     targetId = 1
 
-    hid_set_report(dev, 0x82, struct.pack('BBB', 1, deviceId, targetId))
+    dev.hid_set_report(0x82, struct.pack('BBB', 1, deviceId, targetId))
 
-    k = hid_get_report(dev, 0x83, 4)
-    if k != bytes([deviceId,targetId,1,0xff]):
-        print("ERROR: DualSense is in invalid state: %s. Try to reset it" % (binascii.hexlify(k)))
+    k = ds5.get_calibration_status(dev)
+    if (k.device_id, k.target_id, k.state, k.result) != (deviceId, targetId, 1, 0xff):
+        print("ERROR: DualSense is in invalid state: %s. Try to reset it" % (k, ))
         return
 
     while True:
         print("Press S to sample data or W to store calibration (followed by enter)")
         X = input("> ").upper()
         if X == "S":
-            hid_set_report(dev, 0x82, struct.pack('BBB', 3, deviceId, targetId))
-            assert hid_get_report(dev, 0x83, 4) == bytes([deviceId,targetId,1,0xff])
+            dev.hid_set_report(0x82, struct.pack('BBB', 3, deviceId, targetId))
+            k = ds5.get_calibration_status(dev)
+            assert (k.device_id, k.target_id, k.state, k.result) == (deviceId, targetId, 1, 0xff)
         elif X == "W":
-            hid_set_report(dev, 0x82, struct.pack('BBB', 2, deviceId, targetId))
+            dev.hid_set_report(0x82, struct.pack('BBB', 2, deviceId, targetId))
             break
         else:
             print("Invalid command")
 
     print("Stick calibration done!!")
 
-def do_stick_minmax_calibration():
+def do_stick_minmax_calibration(dev):
     print("Starting analog min-max calibration...")
 
     deviceId = 1
     targetId = 2
 
-    hid_set_report(dev, 0x82, struct.pack('BBB', 1, deviceId, targetId))
-    k = hid_get_report(dev, 0x83, 4)
-    if k != bytes([deviceId,targetId,1,0xff]):
-        print("ERROR: DualSense is in invalid state: %s. Try to reset it" % (binascii.hexlify(k)))
+    dev.hid_set_report(0x82, struct.pack('BBB', 1, deviceId, targetId))
+    k = ds5.get_calibration_status(dev)
+    if (k.device_id, k.target_id, k.state, k.result) != (deviceId, targetId, 1, 0xff):
+        print("ERROR: DualSense is in invalid state: %s. Try to reset it" % (k, ))
         return
 
     print("DualSense is now sampling data. Move the analogs all around their range")
@@ -93,10 +53,23 @@ def do_stick_minmax_calibration():
 
     input()
 
-    hid_set_report(dev, 0x82, struct.pack('BBB', 2, deviceId, targetId))
+    dev.hid_set_report(0x82, struct.pack('BBB', 2, deviceId, targetId))
 
     print("Stick calibration done!!")
 
+def do_info(dev):
+    print(ds5.info(dev))
+
+def do_get_bt_mac_addr(dev):
+    print("DualSense MAC: %s" % (format_mac(ds5.get_bt_mac_addr(dev)), ))
+
+def do_get_calibration_status(dev):
+    print(ds5.get_calibration_status(dev))
+
+def do_state(dev):
+    for i in ds5.state(dev):
+        print(i)
+
 if __name__ == "__main__":
     print("*********************************************************")
     print("* Welcome to the fantastic DualSense Calibration Tool   *")
@@ -109,44 +82,43 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(prog='ds5-calibration-tool')
 
-    parser.add_argument('-p', '--permanent', help="make changes permanent", action='store_true')
+    parser.add_argument('-p', '--permanent', help="make calibration changes permanent", action='store_true')
+    parser.set_defaults(calibration=False)
     subparsers = parser.add_subparsers(dest="action")
 
     p = subparsers.add_parser('analog-center', help="calibrate the center of analog sticks")
-    p.set_defaults(func=do_stick_center_calibration)
+    p.set_defaults(func=do_stick_center_calibration, calibration=True)
 
     p = subparsers.add_parser('analog-range', help="calibrate the range of analog sticks")
-    p.set_defaults(func=do_stick_minmax_calibration)
+    p.set_defaults(func=do_stick_minmax_calibration, calibration=True)
+
+    p = subparsers.add_parser('info', help="print firmware info")
+    p.set_defaults(func=do_info)
+
+    p = subparsers.add_parser('get-bt-mac-addr', help="print the Bluetooth MAC address")
+    p.set_defaults(func=do_get_bt_mac_addr)
+
+    p = subparsers.add_parser('get-calibration-status', help="print the status of the last calibration command")
+    p.set_defaults(func=do_get_calibration_status)
+
+    p = subparsers.add_parser('state', help="print firmware info, MAC address and calibration status")
+    p.set_defaults(func=do_state)
 
     args = parser.parse_args()
     if not hasattr(args, "func"):
         parser.print_help()
         exit(1)
 
-    wait_for_device()
-
-    # Detach kernel driver
-    if sys.platform != 'win32' and dev.is_kernel_driver_active(0):
+    with ds5.session() as dev:
         try:
-            dev.detach_kernel_driver(0)
-        except usb.core.USBError as e:
-            sys.exit('Could not detach kernel driver: %s' % str(e))
-
-    if dev == None:
-        print("Cannot find a DualSense")
-        exit(-1)
-
-    print("== DualSense online! ==")
-
-    if args.permanent:
-        print("Unlocking NVS")
-        hid_set_report(dev, 0x80, struct.pack('BBBBBB', 3, 2, 101, 50, 64, 12))
-
-    try:
-        args.func()
-    except Exception as e:
-        print(e)
-
-    if args.permanent:
-        print("Re-locking NVS")
-        hid_set_report(dev, 0x80, struct.pack('BB', 3, 1))
+            dev.open()
+        except DeviceError as e:
+            sys.exit(str(e))
+        print("== DualSense online! ==")
+
+        # Only calibration writes to NVS, the readers don't need it unlocked
+        with ds5.nvs_unlocked(dev) if args.permanent and args.calibration else nullcontext():
+            try:
+                args.func(dev)
+            except Exception as e:
+                print(e)